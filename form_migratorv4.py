@@ -1,21 +1,125 @@
 import os
 from dotenv import load_dotenv
 import requests
+from requests.adapters import HTTPAdapter
 
 # Cargar variables de entorno
 load_dotenv()
 import json
+import random
+import threading
 import time
-from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import logging
+import math
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa json de la librería estándar
+    orjson = None
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Tipos de campos estándar: existen en todas las cuentas con el mismo ID
+_STANDARD_FIELD_TYPES = frozenset({
+    'subject', 'description', 'status', 'priority', 'type',
+    'assignee', 'group', 'requester', 'collaborator'
+})
+
+# Intentos máximos por petición ante rate limiting (429) o errores 5xx
+_MAX_REQUEST_ATTEMPTS = 8
+
+# Espera máxima entre reintentos, en segundos
+_MAX_RETRY_DELAY = 60.0
+
+# Métodos que se pueden repetir tras un 5xx sin riesgo de crear duplicados
+_IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+# Marca de las claves obligatorias en las especificaciones de copia
+_REQUIRED = object()
+
+
+def _retry_after_delay(retry_after: Optional[str], attempt: int) -> float:
+    """Calcular la espera ante un 429 a partir de Retry-After (segundos o fecha HTTP)"""
+    delay = None
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+                if retry_at.tzinfo is None:
+                    retry_at = retry_at.replace(tzinfo=timezone.utc)
+                delay = (retry_at - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                delay = None
+    
+    # Sin cabecera válida: backoff exponencial con jitter
+    if delay is None or not math.isfinite(delay):
+        delay = 2 ** attempt + random.random()
+    return min(max(delay, 0.0), _MAX_RETRY_DELAY)
+
+
+def _json_loads(raw: bytes) -> Any:
+    """Decodificar JSON (con orjson si está disponible)"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _json_dumps(obj: Any) -> bytes:
+    """Codificar JSON para el cuerpo de una petición"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+
+def _json_pretty(obj: Any) -> str:
+    """Formatear JSON indentado para los logs"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
 class ZendeskFormMigrator:
+    # Claves copiadas al crear un campo en destino: (clave, valor por defecto)
+    _FIELD_COPY_SPEC = (
+        ('type', _REQUIRED),
+        ('title', _REQUIRED),
+        ('description', ''),
+        ('position', 0),
+        ('active', True),
+        ('required', False),
+        ('collapsed_for_agents', False),
+        ('regexp_for_validation', None),
+        ('title_in_portal', None),
+        ('visible_in_portal', True),
+        ('editable_in_portal', True),
+        ('required_in_portal', False),
+        ('tag', None),
+        ('custom_field_options', ()),
+        ('sub_type_id', None),
+        ('removable', True),
+        ('relationship_target_type', None)
+    )
+    
+    # Claves copiadas al crear un formulario en destino: (clave, valor por defecto)
+    _FORM_COPY_SPEC = (
+        ('name', _REQUIRED),
+        ('position', 0),
+        ('active', True),
+        ('end_user_visible', True),
+        ('default', False),
+        ('in_all_brands', True)
+    )
+    
     def __init__(self, source_subdomain: str, source_email: str, source_token: str,
-                 target_subdomain: str, target_email: str, target_token: str):
+                 target_subdomain: str, target_email: str, target_token: str,
+                 cache_ttl: float = 300):
         """
         Inicializar el migrador de formularios de Zendesk
         
@@ -26,6 +130,7 @@ class ZendeskFormMigrator:
             target_subdomain: Subdominio de la cuenta destino
             target_email: Email del usuario en cuenta destino  
             target_token: Token API de cuenta destino
+            cache_ttl: Segundos que se reutilizan los listados obtenidos de la API
         """
         self.source_base_url = f"https://{source_subdomain}.zendesk.com/api/v2"
         self.target_base_url = f"https://{target_subdomain}.zendesk.com/api/v2"
@@ -33,25 +138,84 @@ class ZendeskFormMigrator:
         self.source_auth = (f"{source_email}/token", source_token)
         self.target_auth = (f"{target_email}/token", target_token)
         
+        # Sesiones HTTP persistentes por cuenta (reutilizan conexiones keep-alive)
+        self.source_session = self._create_session(self.source_auth)
+        self.target_session = self._create_session(self.target_auth)
+        self._sessions = {
+            self.source_auth: self.source_session,
+            self.target_auth: self.target_session
+        }
+        
         # Mapeo de IDs entre cuentas
         self.field_id_mapping = {}
         self.brand_id_mapping = {}
         self.group_id_mapping = {}
         
+        # Cache de listados por (endpoint, from_source) -> (timestamp, datos)
+        self.cache_ttl = cache_ttl
+        self._cache: Dict[Tuple[str, bool], Tuple[float, Any]] = {}
+        self._cache_lock = threading.Lock()
+        
+        # Campos origen del último mapeo, indexados por ID para recuperar los faltantes
+        self._source_fields_by_id: Optional[Dict[int, dict]] = None
+        
+        # Campos destino indexados por título; se actualiza al crear campos
+        self._target_fields_by_title: Optional[Dict[str, dict]] = None
+        
+        # Custom objects indexados por 'key', por cuenta (True=origen, False=destino)
+        self._custom_objects_by_key: Dict[bool, Optional[Dict[str, dict]]] = {True: None, False: None}
+        
+        # Evita crear el mismo Custom Object desde creaciones de campos concurrentes
+        self._custom_object_lock = threading.Lock()
+        
+    def close(self) -> None:
+        """Cerrar las sesiones HTTP y liberar sus conexiones"""
+        self.source_session.close()
+        self.target_session.close()
+    
+    def __enter__(self) -> 'ZendeskFormMigrator':
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+    
+    @staticmethod
+    def _create_session(auth: tuple) -> requests.Session:
+        """Crear sesión HTTP con pool de conexiones para una cuenta"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=50, pool_maxsize=50, max_retries=0)
+        session.mount('https://', adapter)
+        session.auth = auth
+        session.headers['Content-Type'] = 'application/json'
+        return session
+    
     def _make_request(self, method: str, url: str, auth: tuple, data: dict = None) -> dict:
         """Realizar petición HTTP con manejo de errores"""
-        headers = {'Content-Type': 'application/json'}
+        session = self._sessions[auth]
+        
+        body = _json_dumps(data) if data is not None else None
         
         try:
-            if method.upper() == 'GET':
-                response = requests.get(url, auth=auth, headers=headers)
-            elif method.upper() == 'POST':
-                response = requests.post(url, auth=auth, headers=headers, json=data)
-            elif method.upper() == 'PUT':
-                response = requests.put(url, auth=auth, headers=headers, json=data)
-            
-            response.raise_for_status()
-            return response.json()
+            for attempt in range(_MAX_REQUEST_ATTEMPTS):
+                response = session.request(method.upper(), url, data=body)
+                
+                # Reintentar 429 respetando Retry-After, y 5xx con backoff exponencial solo
+                # en métodos idempotentes: un 5xx tras un POST puede llegar con el recurso ya creado
+                if attempt < _MAX_REQUEST_ATTEMPTS - 1:
+                    if response.status_code == 429:
+                        delay = _retry_after_delay(response.headers.get('Retry-After'), attempt)
+                    elif response.status_code >= 500 and method.upper() in _IDEMPOTENT_METHODS:
+                        delay = min(_MAX_RETRY_DELAY, 2 ** attempt + random.uniform(0, 1))
+                    else:
+                        delay = None
+                    
+                    if delay is not None:
+                        logger.warning(f"Respuesta {response.status_code} en {method} {url}, reintentando en {delay:.1f}s")
+                        time.sleep(delay)
+                        continue
+                
+                response.raise_for_status()
+                return _json_loads(response.content)
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Error en petición {method} {url}: {str(e)}")
@@ -59,6 +223,42 @@ class ZendeskFormMigrator:
                 logger.error(f"Respuesta del servidor: {e.response.text}")
             raise
     
+    @staticmethod
+    def _run_concurrently(*calls: Callable) -> list:
+        """Ejecutar en paralelo peticiones independientes y devolver sus resultados en orden"""
+        with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+            futures = [executor.submit(call) for call in calls]
+            return [future.result() for future in futures]
+    
+    def _get_cached(self, endpoint: str, from_source: bool, fetch: Callable[[], Any]) -> Any:
+        """Devolver el listado cacheado si sigue vigente, o obtenerlo y guardarlo"""
+        key = (endpoint, from_source)
+        with self._cache_lock:
+            cached = self._cache.get(key)
+        if cached and time.time() - cached[0] < self.cache_ttl:
+            return cached[1]
+        
+        data = fetch()
+        with self._cache_lock:
+            self._cache[key] = (time.time(), data)
+        return data
+    
+    def invalidate_cache(self, from_source: Optional[bool] = None) -> None:
+        """Descartar listados cacheados (de una cuenta o de ambas)"""
+        # Los creadores de campos/formularios invalidan desde varios hilos a la vez
+        with self._cache_lock:
+            if from_source is None:
+                self._cache.clear()
+                return
+            for key in [key for key in self._cache if key[1] == from_source]:
+                del self._cache[key]
+    
+    def invalidate_target_cache(self) -> None:
+        """Descartar todo lo cacheado de la cuenta destino (p. ej. si se modificó externamente)"""
+        self.invalidate_cache(from_source=False)
+        self._target_fields_by_title = None
+        self._custom_objects_by_key[False] = None
+    
     def get_ticket_form(self, form_id: int, from_source: bool = True) -> dict:
         """Obtener un formulario específico"""
         base_url = self.source_base_url if from_source else self.target_base_url
@@ -74,8 +274,10 @@ class ZendeskFormMigrator:
         auth = self.source_auth if from_source else self.target_auth
         
         url = f"{base_url}/ticket_forms"
-        response = self._make_request('GET', url, auth)
-        return response['ticket_forms']
+        return self._get_cached(
+            'ticket_forms', from_source,
+            lambda: self._make_request('GET', url, auth)['ticket_forms']
+        )
     
     def get_ticket_fields(self, from_source: bool = True) -> List[dict]:
         """Obtener todos los campos de ticket"""
@@ -83,8 +285,10 @@ class ZendeskFormMigrator:
         auth = self.source_auth if from_source else self.target_auth
         
         url = f"{base_url}/ticket_fields"
-        response = self._make_request('GET', url, auth)
-        return response['ticket_fields']
+        return self._get_cached(
+            'ticket_fields', from_source,
+            lambda: self._make_request('GET', url, auth)['ticket_fields']
+        )
     
     def get_custom_object(self, key: str, from_source: bool = True) -> Optional[dict]:
         """Obtener definición de objeto personalizado por clave"""
@@ -93,11 +297,12 @@ class ZendeskFormMigrator:
         
         url = f"{base_url}/custom_objects"
         try:
-            response = self._make_request('GET', url, auth)
-            for obj in response.get('custom_objects', []):
-                if obj['key'] == key:
-                    return obj
-            return None
+            if self._custom_objects_by_key[from_source] is None:
+                response = self._make_request('GET', url, auth)
+                self._custom_objects_by_key[from_source] = {
+                    obj['key']: obj for obj in response.get('custom_objects', [])
+                }
+            return self._custom_objects_by_key[from_source].get(key)
         except Exception as e:
             logger.warning(f"Error buscando custom object {key} en {'origen' if from_source else 'destino'}: {str(e)}")
             return None
@@ -116,32 +321,36 @@ class ZendeskFormMigrator:
         payload = {'custom_object': clean_data}
         logger.info(f"Creando Custom Object: {clean_data['key']}")
         response = self._make_request('POST', url, self.target_auth, payload)
+        self._custom_objects_by_key[False] = None
         return response['custom_object']
 
     def ensure_custom_object_exists(self, key: str) -> None:
         """Asegurar que el objeto personalizado exista en destino"""
         logger.info(f"Verificando existencia de Custom Object: {key}")
         
-        # Verificar si ya existe en destino
-        target_obj = self.get_custom_object(key, from_source=False)
-        if target_obj:
-            logger.info(f"Custom Object '{key}' ya existe en destino.")
-            return
+        with self._custom_object_lock:
+            # Consultar destino y origen en paralelo
+            target_obj, source_obj = self._run_concurrently(
+                lambda: self.get_custom_object(key, from_source=False),
+                lambda: self.get_custom_object(key, from_source=True)
+            )
+            if target_obj:
+                logger.info(f"Custom Object '{key}' ya existe en destino.")
+                return
 
-        # Si no existe, obtener de origen
-        logger.info(f"Custom Object '{key}' no encontrado en destino. Buscando en origen...")
-        source_obj = self.get_custom_object(key, from_source=True)
-        
-        if not source_obj:
-            logger.warning(f"Custom Object '{key}' no encontrado en origen. No se puede migrar.")
-            return
+            # Si no existe, usar la definición de origen
+            logger.info(f"Custom Object '{key}' no encontrado en destino. Usando definición de origen...")
             
-        # Crear en destino
-        try:
-            self.create_custom_object(source_obj)
-            logger.info(f"Custom Object '{key}' creado exitosamente en destino.")
-        except Exception as e:
-            logger.error(f"Error al crear Custom Object '{key}': {str(e)}")
+            if not source_obj:
+                logger.warning(f"Custom Object '{key}' no encontrado en origen. No se puede migrar.")
+                return
+                
+            # Crear en destino
+            try:
+                self.create_custom_object(source_obj)
+                logger.info(f"Custom Object '{key}' creado exitosamente en destino.")
+            except Exception as e:
+                logger.error(f"Error al crear Custom Object '{key}': {str(e)}")
             
     def create_ticket_field(self, field_data: dict) -> dict:
         """Crear un campo de ticket en la cuenta destino"""
@@ -158,51 +367,48 @@ class ZendeskFormMigrator:
 
         url = f"{self.target_base_url}/ticket_fields"
         
-        # Limpiar datos del campo para creación
+        # Limpiar datos del campo para creación (omitiendo valores None)
         clean_field_data = {
-            'type': field_data['type'],
-            'title': field_data['title'],
-            'description': field_data.get('description', ''),
-            'position': field_data.get('position', 0),
-            'active': field_data.get('active', True),
-            'required': field_data.get('required', False),
-            'collapsed_for_agents': field_data.get('collapsed_for_agents', False),
-            'regexp_for_validation': field_data.get('regexp_for_validation'),
-            'title_in_portal': field_data.get('title_in_portal'),
-            'visible_in_portal': field_data.get('visible_in_portal', True),
-            'editable_in_portal': field_data.get('editable_in_portal', True),
-            'required_in_portal': field_data.get('required_in_portal', False),
-            'tag': field_data.get('tag'),
-            'custom_field_options': field_data.get('custom_field_options', []),
-            'sub_type_id': field_data.get('sub_type_id'),
-            'removable': field_data.get('removable', True),
-            'relationship_target_type': field_data.get('relationship_target_type')
+            key: value for key, default in self._FIELD_COPY_SPEC
+            if (value := field_data[key] if default is _REQUIRED else field_data.get(key, default)) is not None
         }
         
-        # Remover valores None
-        clean_field_data = {k: v for k, v in clean_field_data.items() if v is not None}
-        
         payload = {'ticket_field': clean_field_data}
         response = self._make_request('POST', url, self.target_auth, payload)
-        return response['ticket_field']
+        new_field = response['ticket_field']
+        self.invalidate_cache(from_source=False)
+        if self._target_fields_by_title is not None:
+            self._target_fields_by_title[new_field['title']] = new_field
+        return new_field
     
     def build_field_mapping(self) -> None:
         """Construir mapeo entre campos de origen y destino"""
+        source_fields, target_fields_by_title = self._run_concurrently(
+            lambda: self.get_ticket_fields(from_source=True),
+            self._get_target_fields_by_title
+        )
+        self._build_field_mapping(source_fields, target_fields_by_title)
+    
+    def _get_target_fields_by_title(self) -> Dict[str, dict]:
+        """Obtener campos destino por título, construyendo el índice solo la primera vez"""
+        if self._target_fields_by_title is None:
+            target_fields = self.get_ticket_fields(from_source=False)
+            self._target_fields_by_title = {field['title']: field for field in target_fields}
+        return self._target_fields_by_title
+    
+    def _build_field_mapping(self, source_fields: List[dict], target_fields_by_title: Dict[str, dict]) -> None:
+        """Construir mapeo de campos a partir de listados ya obtenidos (sin peticiones HTTP)"""
         logger.info("Construyendo mapeo de campos...")
         
-        source_fields = self.get_ticket_fields(from_source=True)
-        target_fields = self.get_ticket_fields(from_source=False)
-        
-        # Crear diccionario de campos destino por título
-        target_fields_by_title = {field['title']: field for field in target_fields}
+        source_fields_by_id = {}
         
         for source_field in source_fields:
             source_id = source_field['id']
             source_title = source_field['title']
+            source_fields_by_id[source_id] = source_field
             
             # Campos estándar siempre existen con el mismo ID
-            if source_field['type'] in ['subject', 'description', 'status', 'priority', 'type', 
-                                      'assignee', 'group', 'requester', 'collaborator']:
+            if source_field['type'] in _STANDARD_FIELD_TYPES:
                 self.field_id_mapping[source_id] = source_id
                 continue
             
@@ -210,96 +416,120 @@ class ZendeskFormMigrator:
             if source_title in target_fields_by_title:
                 target_field = target_fields_by_title[source_title]
                 self.field_id_mapping[source_id] = target_field['id']
-                logger.info(f"Campo mapeado: '{source_title}' {source_id} -> {target_field['id']}")
+                logger.info("Campo mapeado: '%s' %s -> %s", source_title, source_id, target_field['id'])
             else:
-                logger.warning(f"Campo no encontrado en destino: '{source_title}' (ID: {source_id})")
+                logger.warning("Campo no encontrado en destino: '%s' (ID: %s)", source_title, source_id)
+        
+        self._source_fields_by_id = source_fields_by_id
     
-    def migrate_missing_fields(self, form_data: dict) -> None:
+    def migrate_missing_fields(self, form_data: dict, max_workers: int = 5) -> None:
         """Migrar campos faltantes del formulario"""
         logger.info("Verificando campos faltantes...")
         
-        source_fields = self.get_ticket_fields(from_source=True)
-        source_fields_dict = {field['id']: field for field in source_fields}
+        # Reutilizar los campos origen obtenidos al construir el mapeo
+        source_fields_by_id = self._source_fields_by_id
+        if source_fields_by_id is None:
+            source_fields_by_id = {field['id']: field for field in self.get_ticket_fields(from_source=True)}
         
         missing_fields = []
         for field_id in form_data.get('ticket_field_ids', []):
             if field_id not in self.field_id_mapping:
-                if field_id in source_fields_dict:
-                    missing_fields.append(source_fields_dict[field_id])
+                if field_id in source_fields_by_id:
+                    missing_fields.append(source_fields_by_id[field_id])
         
-        for field in missing_fields:
+        def create_field(field: dict) -> Optional[Tuple[int, int]]:
             try:
-                logger.info(f"Creando campo faltante: {field['title']}")
+                logger.info("Creando campo faltante: %s", field['title'])
                 new_field = self.create_ticket_field(field)
-                self.field_id_mapping[field['id']] = new_field['id']
-                logger.info(f"Campo creado exitosamente: {field['title']} -> ID {new_field['id']}")
-                time.sleep(1)  # Evitar rate limiting
+                logger.info("Campo creado exitosamente: %s -> ID %s", field['title'], new_field['id'])
+                return field['id'], new_field['id']
             except Exception as e:
-                logger.error(f"Error creando campo {field['title']}: {str(e)}")
+                logger.error("Error creando campo %s: %s", field['title'], e)
+                return None
+        
+        if not missing_fields:
+            return
+        
+        # Crear campos en paralelo con concurrencia acotada
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            created = list(executor.map(create_field, missing_fields))
+        
+        self.field_id_mapping.update(pair for pair in created if pair)
     
     def transform_conditions(self, conditions: List[dict]) -> List[dict]:
         """Transformar condiciones del formulario para usar nuevos IDs"""
-        """hola"""
         if not conditions:
             logger.info("No hay condiciones para transformar")
             return []
             
         logger.info(f"Transformando {len(conditions)} condiciones...")
-        transformed_conditions = []
+        mapping = self.field_id_mapping
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        transformed_conditions = self._transform_condition_list(conditions, mapping, debug_enabled)
         
-        for i, condition in enumerate(conditions):
-            logger.debug(f"Procesando condición {i+1}: {json.dumps(condition, indent=2)}")
-            new_condition = {}
-            
-            # Copiar propiedades básicas
-            for key in ['parent_field_id', 'parent_field_type', 'value', 'operator']:
-                if key in condition:
-                    new_condition[key] = condition[key]
-            
-            # Mapear parent_field_id si existe en el mapeo
-            if 'parent_field_id' in condition:
-                original_field_id = condition['parent_field_id']
-                if original_field_id in self.field_id_mapping:
-                    new_condition['parent_field_id'] = self.field_id_mapping[original_field_id]
-                    logger.debug(f"Mapeado parent_field_id: {original_field_id} -> {self.field_id_mapping[original_field_id]}")
-                else:
-                    logger.warning(f"parent_field_id {original_field_id} no encontrado en mapeo")
-                    new_condition['parent_field_id'] = original_field_id
-            
-            # Procesar child_fields (campos que se muestran/ocultan según la condición)
-            if 'child_fields' in condition and condition['child_fields']:
-                new_child_fields = []
-                for child_field in condition['child_fields']:
-                    new_child_field = {}
-                    
-                    # Copiar todas las propiedades del child_field
-                    for child_key, child_value in child_field.items():
-                        new_child_field[child_key] = child_value
-                    
-                    # Mapear el ID del campo hijo si existe
-                    if 'id' in child_field:
-                        original_child_id = child_field['id']
-                        if original_child_id in self.field_id_mapping:
-                            new_child_field['id'] = self.field_id_mapping[original_child_id]
-                            logger.debug(f"Mapeado child_field id: {original_child_id} -> {self.field_id_mapping[original_child_id]}")
-                        else:
-                            logger.warning(f"child_field id {original_child_id} no encontrado en mapeo")
-                    
-                    new_child_fields.append(new_child_field)
+        logger.info(f"Transformación completada: {len(transformed_conditions)} condiciones procesadas")
+        return transformed_conditions
+    
+    def _transform_condition_list(self, conditions: List[dict], mapping: Dict[int, int],
+                                  debug_enabled: bool) -> List[dict]:
+        """Transformar una lista de condiciones, sin reconstruirlas si el mapeo no cambia ningún ID"""
+        referenced_ids = {condition.get('parent_field_id') for condition in conditions}
+        referenced_ids.update(
+            child_field.get('id') for condition in conditions for child_field in condition.get('child_fields') or []
+        )
+        referenced_ids.discard(None)
+        
+        # Solo se omite si todos los IDs están mapeados a sí mismos (los no mapeados siguen avisando)
+        if all(mapping.get(field_id) == field_id for field_id in referenced_ids):
+            logger.debug("Mapeo identidad para %d condiciones, se reutilizan sin cambios", len(conditions))
+            return list(conditions)
+        
+        return [self._transform_condition(condition, mapping, debug_enabled) for condition in conditions]
+    
+    @staticmethod
+    def _transform_condition(condition: dict, mapping: Dict[int, int], debug_enabled: bool) -> dict:
+        """Transformar una condición sustituyendo los IDs de campo según el mapeo"""
+        if debug_enabled:
+            logger.debug("Procesando condición: %s", _json_pretty(condition))
+        
+        # Copiar todas las propiedades de la condición
+        new_condition = condition.copy()
+        
+        # Mapear parent_field_id si existe en el mapeo
+        if 'parent_field_id' in condition:
+            original_field_id = condition['parent_field_id']
+            new_field_id = mapping.get(original_field_id)
+            if new_field_id is not None:
+                new_condition['parent_field_id'] = new_field_id
+                logger.debug("Mapeado parent_field_id: %s -> %s", original_field_id, new_field_id)
+            else:
+                logger.warning("parent_field_id %s no encontrado en mapeo", original_field_id)
+        
+        # Procesar child_fields (campos que se muestran/ocultan según la condición)
+        child_fields = condition.get('child_fields')
+        if child_fields:
+            new_child_fields = []
+            for child_field in child_fields:
+                new_child_field = child_field.copy()
                 
-                new_condition['child_fields'] = new_child_fields
-                logger.debug(f"Procesados {len(new_child_fields)} child_fields")
-            
-            # Copiar cualquier otra propiedad que pueda existir
-            for key, value in condition.items():
-                if key not in ['parent_field_id', 'parent_field_type', 'value', 'operator', 'child_fields']:
-                    new_condition[key] = value
+                # Mapear el ID del campo hijo si existe
+                if 'id' in child_field:
+                    original_child_id = child_field['id']
+                    new_child_id = mapping.get(original_child_id)
+                    if new_child_id is not None:
+                        new_child_field['id'] = new_child_id
+                        logger.debug("Mapeado child_field id: %s -> %s", original_child_id, new_child_id)
+                    else:
+                        logger.warning("child_field id %s no encontrado en mapeo", original_child_id)
+                
+                new_child_fields.append(new_child_field)
             
-            transformed_conditions.append(new_condition)
-            logger.debug(f"Condición transformada: {json.dumps(new_condition, indent=2)}")
+            new_condition['child_fields'] = new_child_fields
+            logger.debug("Procesados %d child_fields", len(new_child_fields))
         
-        logger.info(f"Transformación completada: {len(transformed_conditions)} condiciones procesadas")
-        return transformed_conditions
+        if debug_enabled:
+            logger.debug("Condición transformada: %s", _json_pretty(new_condition))
+        return new_condition
     
     def create_ticket_form(self, form_data: dict, debug_mode: bool = False) -> dict:
         """Crear formulario en cuenta destino"""
@@ -312,9 +542,9 @@ class ZendeskFormMigrator:
         for field_id in form_data.get('ticket_field_ids', []):
             if field_id in self.field_id_mapping:
                 new_field_ids.append(self.field_id_mapping[field_id])
-                logger.debug(f"Campo mapeado: {field_id} -> {self.field_id_mapping[field_id]}")
+                logger.debug("Campo mapeado: %s -> %s", field_id, self.field_id_mapping[field_id])
             else:
-                logger.warning(f"Campo ID {field_id} no encontrado en mapeo")
+                logger.warning("Campo ID %s no encontrado en mapeo", field_id)
                 missing_fields.append(field_id)
         
         if missing_fields:
@@ -328,27 +558,28 @@ class ZendeskFormMigrator:
         logger.info(f"Condiciones agent originales: {len(agent_conditions)}")
         
         if end_user_conditions and debug_mode:
-            logger.debug(f"end_user_conditions raw: {json.dumps(end_user_conditions, indent=2)}")
+            logger.debug(f"end_user_conditions raw: {_json_pretty(end_user_conditions)}")
         if agent_conditions and debug_mode:
-            logger.debug(f"agent_conditions raw: {json.dumps(agent_conditions, indent=2)}")
+            logger.debug(f"agent_conditions raw: {_json_pretty(agent_conditions)}")
         
-        new_end_user_conditions = self.transform_conditions(end_user_conditions)
-        new_agent_conditions = self.transform_conditions(agent_conditions)
+        # Transformar ambas listas con un único helper, sin repetir el preámbulo por lista
+        mapping = self.field_id_mapping
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        new_end_user_conditions = self._transform_condition_list(end_user_conditions, mapping, debug_enabled)
+        new_agent_conditions = self._transform_condition_list(agent_conditions, mapping, debug_enabled)
         
         logger.info(f"Condiciones end_user transformadas: {len(new_end_user_conditions)}")
         logger.info(f"Condiciones agent transformadas: {len(new_agent_conditions)}")
         
-        # Preparar datos del formulario
+        # Preparar datos del formulario (omitiendo valores None)
         new_form_data = {
-            'name': form_data['name'],
-            'display_name': form_data.get('display_name', form_data['name']),
-            'position': form_data.get('position', 0),
-            'active': form_data.get('active', True),
-            'end_user_visible': form_data.get('end_user_visible', True),
-            'default': form_data.get('default', False),
-            'ticket_field_ids': new_field_ids,
-            'in_all_brands': form_data.get('in_all_brands', True)
+            key: value for key, default in self._FORM_COPY_SPEC
+            if (value := form_data[key] if default is _REQUIRED else form_data.get(key, default)) is not None
         }
+        display_name = form_data.get('display_name', form_data['name'])
+        if display_name is not None:
+            new_form_data['display_name'] = display_name
+        new_form_data['ticket_field_ids'] = new_field_ids
         
         # Agregar condiciones si existen
         if new_end_user_conditions:
@@ -362,22 +593,21 @@ class ZendeskFormMigrator:
         if not new_end_user_conditions and not new_agent_conditions:
             logger.info("No se agregaron condiciones al formulario")
         
-        # Remover valores None
-        new_form_data = {k: v for k, v in new_form_data.items() if v is not None}
-        
-        logger.debug(f"Datos finales del formulario: {json.dumps(new_form_data, indent=2)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Datos finales del formulario: %s", _json_pretty(new_form_data))
         
         url = f"{self.target_base_url}/ticket_forms"
         payload = {'ticket_form': new_form_data}
         
         try:
             response = self._make_request('POST', url, self.target_auth, payload)
+            self.invalidate_cache(from_source=False)
             logger.info("Formulario creado exitosamente")
             return response['ticket_form']
         except Exception as e:
             logger.error(f"Error creando formulario: {str(e)}")
             # Log del payload que causó el error
-            logger.error(f"Payload que causó error: {json.dumps(payload, indent=2)}")
+            logger.error(f"Payload que causó error: {_json_pretty(payload)}")
             raise
     
     def migrate_form(self, form_id: int, debug_mode: bool = False) -> dict:
@@ -389,8 +619,12 @@ class ZendeskFormMigrator:
         logger.info(f"Iniciando migración del formulario ID: {form_id}")
         
         try:
-            # 1. Obtener formulario origen
-            source_form = self.get_ticket_form(form_id, from_source=True)
+            # 1. Obtener formulario origen y campos de ambas cuentas en paralelo
+            source_form, source_fields, target_fields_by_title = self._run_concurrently(
+                lambda: self.get_ticket_form(form_id, from_source=True),
+                lambda: self.get_ticket_fields(from_source=True),
+                self._get_target_fields_by_title
+            )
             logger.info(f"Formulario obtenido: {source_form['name']}")
             
             # Log de información del formulario origen
@@ -399,10 +633,10 @@ class ZendeskFormMigrator:
             logger.info(f"Condiciones agent en formulario origen: {len(source_form.get('agent_conditions', []))}")
             
             if debug_mode:
-                logger.debug(f"Formulario completo: {json.dumps(source_form, indent=2)}")
+                logger.debug(f"Formulario completo: {_json_pretty(source_form)}")
             
             # 2. Construir mapeo de campos
-            self.build_field_mapping()
+            self._build_field_mapping(source_fields, target_fields_by_title)
             
             # 3. Migrar campos faltantes
             self.migrate_missing_fields(source_form)
@@ -410,46 +644,109 @@ class ZendeskFormMigrator:
             # 4. Crear formulario en destino
             new_form = self.create_ticket_form(source_form, debug_mode=debug_mode)
             
-            logger.info(f"Formulario migrado exitosamente: {new_form['name']} (ID: {new_form['id']})")
+            return self._migration_result(source_form, new_form)
+            
+        except Exception as e:
+            logger.error(f"Error migrando formulario: {str(e)}")
+            return self._error_result(e)
+    
+    def migrate_forms(self, form_ids: List[int], max_concurrency: int = 5, debug_mode: bool = False) -> List[dict]:
+        """Migrar varios formularios compartiendo un único mapeo de campos"""
+        if debug_mode:
+            logger.setLevel(logging.DEBUG)
+        
+        logger.info(f"Iniciando migración de {len(form_ids)} formularios: {form_ids}")
+        results = {}
+        
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            # 1. Obtener campos de ambas cuentas y todos los formularios origen en paralelo
+            source_fields_future = executor.submit(self.get_ticket_fields, True)
+            target_fields_future = executor.submit(self._get_target_fields_by_title)
+            form_futures = {
+                form_id: executor.submit(self.get_ticket_form, form_id, True)
+                for form_id in dict.fromkeys(form_ids)
+            }
+            
+            try:
+                source_fields = source_fields_future.result()
+                target_fields_by_title = target_fields_future.result()
+            except Exception as e:
+                logger.error(f"Error obteniendo campos de ticket: {str(e)}")
+                return [self._error_result(e) for _ in form_ids]
             
-            # Verificar si las condiciones se migraron correctamente
-            final_end_user_conditions = len(new_form.get('end_user_conditions', []))
-            final_agent_conditions = len(new_form.get('agent_conditions', []))
-            original_end_user_conditions = len(source_form.get('end_user_conditions', []))
-            original_agent_conditions = len(source_form.get('agent_conditions', []))
+            source_forms = {}
+            for form_id, future in form_futures.items():
+                try:
+                    source_forms[form_id] = future.result()
+                    logger.info(f"Formulario obtenido: {source_forms[form_id]['name']} (ID: {form_id})")
+                except Exception as e:
+                    logger.error(f"Error obteniendo formulario {form_id}: {str(e)}")
+                    results[form_id] = self._error_result(e)
             
-            total_final = final_end_user_conditions + final_agent_conditions
-            total_original = original_end_user_conditions + original_agent_conditions
+            # 2. Construir mapeo de campos una sola vez
+            self._build_field_mapping(source_fields, target_fields_by_title)
             
-            if total_final != total_original:
-                logger.warning(f"Discrepancia en condiciones: Original={total_original}, Migrado={total_final}")
-            else:
-                logger.info(f"Condiciones migradas correctamente: {total_final}")
+            # 3. Migrar una sola vez los campos faltantes de todos los formularios
+            all_field_ids = list(dict.fromkeys(
+                field_id for form in source_forms.values() for field_id in form.get('ticket_field_ids', [])
+            ))
+            self.migrate_missing_fields({'ticket_field_ids': all_field_ids}, max_workers=max_concurrency)
             
-            return {
-                'status': 'success',
-                'source_form': source_form,
-                'migrated_form': new_form,
-                'field_mappings': self.field_id_mapping,
-                'conditions_migrated': {
-                    'end_user': final_end_user_conditions,
-                    'agent': final_agent_conditions,
-                    'total': total_final
-                },
-                'conditions_original': {
-                    'end_user': original_end_user_conditions,
-                    'agent': original_agent_conditions,
-                    'total': total_original
-                }
-            }
+            # 4. Crear formularios en destino con concurrencia acotada
+            def create_form(source_form: dict) -> dict:
+                try:
+                    new_form = self.create_ticket_form(source_form, debug_mode=debug_mode)
+                    return self._migration_result(source_form, new_form)
+                except Exception as e:
+                    logger.error(f"Error migrando formulario {source_form['id']}: {str(e)}")
+                    return self._error_result(e)
             
-        except Exception as e:
-            logger.error(f"Error migrando formulario: {str(e)}")
-            return {
-                'status': 'error',
-                'error': str(e),
-                'field_mappings': self.field_id_mapping
+            results.update(zip(source_forms, executor.map(create_form, source_forms.values())))
+        
+        return [results[form_id] for form_id in form_ids]
+    
+    def _migration_result(self, source_form: dict, new_form: dict) -> dict:
+        """Verificar las condiciones migradas y construir el resultado de la migración"""
+        logger.info(f"Formulario migrado exitosamente: {new_form['name']} (ID: {new_form['id']})")
+        
+        # Verificar si las condiciones se migraron correctamente
+        final_end_user_conditions = len(new_form.get('end_user_conditions', []))
+        final_agent_conditions = len(new_form.get('agent_conditions', []))
+        original_end_user_conditions = len(source_form.get('end_user_conditions', []))
+        original_agent_conditions = len(source_form.get('agent_conditions', []))
+        
+        total_final = final_end_user_conditions + final_agent_conditions
+        total_original = original_end_user_conditions + original_agent_conditions
+        
+        if total_final != total_original:
+            logger.warning(f"Discrepancia en condiciones: Original={total_original}, Migrado={total_final}")
+        else:
+            logger.info(f"Condiciones migradas correctamente: {total_final}")
+        
+        return {
+            'status': 'success',
+            'source_form': source_form,
+            'migrated_form': new_form,
+            'field_mappings': self.field_id_mapping,
+            'conditions_migrated': {
+                'end_user': final_end_user_conditions,
+                'agent': final_agent_conditions,
+                'total': total_final
+            },
+            'conditions_original': {
+                'end_user': original_end_user_conditions,
+                'agent': original_agent_conditions,
+                'total': total_original
             }
+        }
+    
+    def _error_result(self, error: Exception) -> dict:
+        """Construir el resultado de una migración fallida"""
+        return {
+            'status': 'error',
+            'error': str(error),
+            'field_mappings': self.field_id_mapping
+        }
     
     def list_forms(self, from_source: bool = True) -> None:
         """Listar todos los formularios disponibles"""
@@ -483,59 +780,59 @@ def main():
         print("Variables requeridas: SOURCE_SUBDOMAIN, SOURCE_EMAIL, SOURCE_TOKEN")
         print("                      TARGET_SUBDOMAIN, TARGET_EMAIL, TARGET_TOKEN")
         return
-    # Crear instancia del migrador
-    migrator = ZendeskFormMigrator(
+    # Crear instancia del migrador (cierra sus sesiones HTTP al terminar)
+    with ZendeskFormMigrator(
         SOURCE_CONFIG['subdomain'], SOURCE_CONFIG['email'], SOURCE_CONFIG['token'],
         TARGET_CONFIG['subdomain'], TARGET_CONFIG['email'], TARGET_CONFIG['token']
-    )
+    ) as migrator:
     
-    # Listar formularios disponibles
-    print("Obteniendo lista de formularios...")
-    migrator.list_forms(from_source=True)
+        # Listar formularios disponibles
+        print("Obteniendo lista de formularios...")
+        migrator.list_forms(from_source=True)
     
-    # Migrar formulario específico
-    form_id_to_migrate = input("\nIngresa el ID del formulario a migrar: ")
+        # Migrar formulario específico
+        form_id_to_migrate = input("\nIngresa el ID del formulario a migrar: ")
     
-    try:
-        form_id = int(form_id_to_migrate)
+        try:
+            form_id = int(form_id_to_migrate)
         
-        # Preguntar si quiere modo debug
-        debug_input = input("¿Activar modo debug para ver detalles? (s/n): ").lower().strip()
-        debug_mode = debug_input in ['s', 'si', 'sí', 'y', 'yes']
+            # Preguntar si quiere modo debug
+            debug_input = input("¿Activar modo debug para ver detalles? (s/n): ").lower().strip()
+            debug_mode = debug_input in ['s', 'si', 'sí', 'y', 'yes']
         
-        result = migrator.migrate_form(form_id, debug_mode=debug_mode)
+            result = migrator.migrate_form(form_id, debug_mode=debug_mode)
         
-        if result['status'] == 'success':
-            print(f"\nMigración exitosa!")
-            print(f"Formulario creado con ID: {result['migrated_form']['id']}")
-            print(f"Mapeo de campos utilizado: {len(result['field_mappings'])} campos mapeados")
+            if result['status'] == 'success':
+                print(f"\nMigración exitosa!")
+                print(f"Formulario creado con ID: {result['migrated_form']['id']}")
+                print(f"Mapeo de campos utilizado: {len(result['field_mappings'])} campos mapeados")
             
-            conditions_orig = result['conditions_original']
-            conditions_migr = result['conditions_migrated']
+                conditions_orig = result['conditions_original']
+                conditions_migr = result['conditions_migrated']
             
-            print(f"\nCondiciones originales:")
-            print(f"  - End user: {conditions_orig['end_user']}")
-            print(f"  - Agent: {conditions_orig['agent']}")
-            print(f"  - Total: {conditions_orig['total']}")
+                print(f"\nCondiciones originales:")
+                print(f"  - End user: {conditions_orig['end_user']}")
+                print(f"  - Agent: {conditions_orig['agent']}")
+                print(f"  - Total: {conditions_orig['total']}")
             
-            print(f"\nCondiciones migradas:")
-            print(f"  - End user: {conditions_migr['end_user']}")
-            print(f"  - Agent: {conditions_migr['agent']}")
-            print(f"  - Total: {conditions_migr['total']}")
+                print(f"\nCondiciones migradas:")
+                print(f"  - End user: {conditions_migr['end_user']}")
+                print(f"  - Agent: {conditions_migr['agent']}")
+                print(f"  - Total: {conditions_migr['total']}")
             
-            if conditions_orig['total'] > 0 and conditions_migr['total'] == 0:
-                print("\nADVERTENCIA: El formulario original tenía condiciones pero no se migraron.")
-                print("Revisa los logs para más detalles.")
-            elif conditions_orig['total'] != conditions_migr['total']:
-                print(f"\nADVERTENCIA: Discrepancia en número de condiciones.")
-                print("Revisa los logs para más detalles.")
-        else:
-            print(f"\nError en migración: {result['error']}")
+                if conditions_orig['total'] > 0 and conditions_migr['total'] == 0:
+                    print("\nADVERTENCIA: El formulario original tenía condiciones pero no se migraron.")
+                    print("Revisa los logs para más detalles.")
+                elif conditions_orig['total'] != conditions_migr['total']:
+                    print(f"\nADVERTENCIA: Discrepancia en número de condiciones.")
+                    print("Revisa los logs para más detalles.")
+            else:
+                print(f"\nError en migración: {result['error']}")
             
-    except ValueError:
-        print("Por favor ingresa un ID válido (número)")
-    except Exception as e:
-        print(f"Error inesperado: {str(e)}")
+        except ValueError:
+            print("Por favor ingresa un ID válido (número)")
+        except Exception as e:
+            print(f"Error inesperado: {str(e)}")
 
 if __name__ == "__main__":
     main()